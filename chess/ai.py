@@ -1,5 +1,12 @@
 """
 ai.py -- Defines functions for running minimax and minimax with alpha beta pruning.
+
+Both functions take an optional transposition table, a dictionary mapping
+board.key(turn) to a (depth, score, flag, move) tuple for a position already
+searched to depth. flag tells whether score is the exact score (EXACT) or
+only a lower (LOWER) or upper (UPPER) bound of it, as happens when alpha beta
+pruning cuts the search short. A new table is made for each search unless
+one is passed in.
 """
 
 from chess.chess import *
@@ -7,36 +14,66 @@ import math
 
 gamma = 0.99
 
-def minimax(board, depth, turn, heuristic=None):
+# Transposition table flags
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+def minimax(board, depth, turn, heuristic=None, table=None):
     if depth == 0:
         return board.compute_score(turn), None
+    if table is None:
+        table = {}
+    key = board.key(turn)
+    entry = table.get(key)
+    if entry and entry[0] >= depth:
+        return entry[1], entry[3]
 
     maximum = -10000
     best_move = None
-    for move, b in board.get_moves(turn, heuristic):
-        if b.in_check(turn):
-            continue
-        opp_score, prev_move = minimax(b, depth - 1, 1 - turn)
+    for move in board.generate_moves(turn, heuristic, legal=True):
+        undo = board.make_move(move)
+        opp_score, prev_move = minimax(board, depth - 1, 1 - turn,
+                                       table=table)
+        board.unmake_move(undo)
         opp_score *= gamma # Make sooner checkmates higher worth
         if -opp_score >= maximum:
             maximum = -opp_score
             best_move = move
             best_move.next = prev_move
+    table[key] = (depth, maximum, EXACT, best_move)
     return maximum, best_move
 
 
 def minimax_with_pruning(board, depth, 
         turn, alpha=-math.inf, beta=math.inf, 
-        heuristic=None):
+        heuristic=None, table=None):
     if depth == 0:
         return board.compute_score(turn), None
+    if table is None:
+        table = {}
+    key = board.key(turn)
+    entry = table.get(key)
+    if entry and entry[0] >= depth:
+        _, score, flag, move = entry
+        if flag == EXACT:
+            return score, move
+        if flag == LOWER:
+            alpha = max(alpha, score)
+        else:
+            beta = min(beta, score)
+        if alpha >= beta:
+            return score, move
+
+    original_alpha = alpha
     maximum = -10000
     best_move = None
-    for move, b in board.get_moves(turn):
-        if b.in_check(turn):
-            continue
-        opp_score, prev_move = minimax_with_pruning(b, depth - 1,
-                                                    -beta, -alpha, 1 - turn, heuristic)
+    for move in board.generate_moves(turn, heuristic, legal=True):
+        undo = board.make_move(move)
+        opp_score, prev_move = minimax_with_pruning(board, depth - 1,
+                                                    1 - turn, -beta, -alpha, heuristic,
+                                                    table)
+        board.unmake_move(undo)
         if -opp_score > maximum:
             maximum = -opp_score
             best_move = move
@@ -44,4 +81,12 @@ def minimax_with_pruning(board, depth,
         alpha = max(alpha, -opp_score)
         if alpha >= beta:
             break
+
+    if maximum <= original_alpha:
+        flag = UPPER
+    elif maximum >= beta:
+        flag = LOWER
+    else:
+        flag = EXACT
+    table[key] = (depth, maximum, flag, best_move)
     return maximum, best_move
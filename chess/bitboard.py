@@ -0,0 +1,327 @@
+"""
+bitboard.py -- Defines the precomputed tables used by the bitboard
+representation of the board.
+
+A bitboard is an int whose bit at index row * 8 + col is set when the
+square (row, col) is occupied. a1 is bit 0, h1 is bit 7 and h8 is bit 63.
+"""
+
+import random
+import numpy as np
+
+# The eight directions a piece may slide in, given as (row, col) units.
+# The first four are straight and the last four are diagonal.
+DIRECTIONS = [(1, 0), (0, 1), (-1, 0), (0, -1),
+              (1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+
+def generate_between():
+    """
+    Generates a 64 x 64 table where between[a][b] is the bitboard of the
+    squares strictly between a and b. If a and b do not share a row, column
+    or diagonal, or if they are adjacent, then the entry is 0.
+    >>> between = generate_between()
+    >>> between[0][3] == (1 << 1) | (1 << 2) # a1 to d1
+    True
+    >>> between[0][63] == sum(1 << (9 * i) for i in range(1, 7)) # a1 to h8
+    True
+    >>> between[0][1], between[0][10] # Adjacent; not aligned
+    (0, 0)
+    """
+    between = [[0] * 64 for _ in range(64)]
+    for square in range(64):
+        for row_unit, col_unit in DIRECTIONS:
+            row = square // 8 + row_unit
+            col = square % 8 + col_unit
+            mask = 0
+            while 0 <= row < 8 and 0 <= col < 8:
+                between[square][row * 8 + col] = mask
+                mask |= 1 << (row * 8 + col)
+                row += row_unit
+                col += col_unit
+    return between
+
+
+BETWEEN = generate_between()
+
+# BETWEEN as a uint64 numpy array, which compiled numba kernels can read.
+BETWEEN_ARRAY = np.array(BETWEEN, dtype=np.uint64)
+
+
+def generate_rays():
+    """
+    Generates a table where rays[direction][square] is the bitboard of the
+    squares reached by sliding from square to the edge of the board in
+    DIRECTIONS[direction], not including square itself.
+    >>> rays = generate_rays()
+    >>> rays[0][0] == sum(1 << (8 * i) for i in range(1, 8)) # a1 upwards
+    True
+    >>> rays[3][0] # a1 leftwards
+    0
+    """
+    rays = [[0] * 64 for _ in DIRECTIONS]
+    for direction, (row_unit, col_unit) in enumerate(DIRECTIONS):
+        for square in range(64):
+            row = square // 8 + row_unit
+            col = square % 8 + col_unit
+            while 0 <= row < 8 and 0 <= col < 8:
+                rays[direction][square] |= 1 << (row * 8 + col)
+                row += row_unit
+                col += col_unit
+    return rays
+
+
+RAYS = generate_rays()
+
+
+def generate_ray_squares():
+    """
+    Generates a table where ray_squares[square][direction] is the list of
+    the squares reached by sliding from square to the edge of the board in
+    DIRECTIONS[direction], from nearest to farthest.
+    >>> ray_squares = generate_ray_squares()
+    >>> ray_squares[0][4] # a1 to h8
+    [9, 18, 27, 36, 45, 54, 63]
+    >>> ray_squares[0][2] # a1 downwards
+    []
+    """
+    ray_squares = [[[] for _ in DIRECTIONS] for _ in range(64)]
+    for square in range(64):
+        for direction, (row_unit, col_unit) in enumerate(DIRECTIONS):
+            row = square // 8 + row_unit
+            col = square % 8 + col_unit
+            while 0 <= row < 8 and 0 <= col < 8:
+                ray_squares[square][direction].append(row * 8 + col)
+                row += row_unit
+                col += col_unit
+    return ray_squares
+
+
+RAY_SQUARES = generate_ray_squares()
+
+# Directions along which the square index increases. Squares along these
+# rays are ordered by their lowest set bit, the others by their highest.
+POSITIVE = [row_unit * 8 + col_unit > 0 for row_unit, col_unit in DIRECTIONS]
+
+
+def generate_line():
+    """
+    Generates a 64 x 64 table where line[a][b] is the bitboard of the whole
+    row, column or diagonal through a and b, from edge to edge. If a and b
+    do not share one, or if they are the same square, then the entry is 0.
+    >>> line = generate_line()
+    >>> line[0][9] == sum(1 << (9 * i) for i in range(8)) # a1, b2 to h8
+    True
+    >>> line[0][10], line[0][0]
+    (0, 0)
+    """
+    line = [[0] * 64 for _ in range(64)]
+    for square in range(64):
+        for direction, (row_unit, col_unit) in enumerate(DIRECTIONS):
+            opposite = DIRECTIONS.index((-row_unit, -col_unit))
+            full = RAYS[direction][square] | RAYS[opposite][square]\
+                | 1 << square
+            ray = RAYS[direction][square]
+            while ray:
+                bit = ray & -ray
+                ray ^= bit
+                line[square][bit.bit_length() - 1] = full
+    return line
+
+
+LINE = generate_line()
+
+ROOK_DIRECTIONS = range(0, 4)
+BISHOP_DIRECTIONS = range(4, 8)
+QUEEN_DIRECTIONS = range(0, 8)
+
+
+def ray_attacks(square, direction, occupied):
+    """
+    Returns the bitboard of the squares attacked from square along
+    DIRECTIONS[direction], up to and including the first occupied square.
+    >>> ray_attacks(0, 0, 1 << 24) == (1 << 8) | (1 << 16) | (1 << 24)
+    True
+    >>> ray_attacks(24, 2, 1 << 16) == 1 << 16
+    True
+    """
+    attacks = RAYS[direction][square]
+    blockers = attacks & occupied
+    if blockers:
+        if POSITIVE[direction]:
+            blocker = (blockers & -blockers).bit_length() - 1
+        else:
+            blocker = blockers.bit_length() - 1
+        attacks ^= RAYS[direction][blocker]
+    return attacks
+
+
+def rook_attacks(square, occupied):
+    """
+    Returns the bitboard of the squares a rook on square attacks.
+    >>> bin(rook_attacks(0, 0)).count("1")
+    14
+    >>> rook_attacks(0, (1 << 1) | (1 << 8)) == (1 << 1) | (1 << 8)
+    True
+    """
+    return ray_attacks(square, 0, occupied) | ray_attacks(square, 1, occupied)\
+        | ray_attacks(square, 2, occupied) | ray_attacks(square, 3, occupied)
+
+
+def bishop_attacks(square, occupied):
+    """
+    Returns the bitboard of the squares a bishop on square attacks.
+    >>> bin(bishop_attacks(27, 0)).count("1")
+    13
+    >>> bishop_attacks(0, 1 << 9) == 1 << 9
+    True
+    """
+    return ray_attacks(square, 4, occupied) | ray_attacks(square, 5, occupied)\
+        | ray_attacks(square, 6, occupied) | ray_attacks(square, 7, occupied)
+
+
+def queen_attacks(square, occupied):
+    """
+    Returns the bitboard of the squares a queen on square attacks.
+    >>> bin(queen_attacks(27, 0)).count("1")
+    27
+    """
+    return rook_attacks(square, occupied) | bishop_attacks(square, occupied)
+
+# Returns the number of set bits of a bitboard. int.bit_count, which is
+# new in Python 3.10, is much faster than counting the ones of bin.
+if hasattr(int, "bit_count"):
+    popcount = int.bit_count
+else:
+    def popcount(bitboard):
+        return bin(bitboard).count("1")
+
+# The file (column) and rank (row) of each square.
+FILE_OF = [square % 8 for square in range(64)]
+RANK_OF = [square // 8 for square in range(64)]
+
+# Castling rights are kept as an int with one bit per right.
+WHITE_KING_SIDE = 1
+WHITE_QUEEN_SIDE = 2
+BLACK_KING_SIDE = 4
+BLACK_QUEEN_SIDE = 8
+ALL_CASTLES = 15
+
+
+def generate_castle_clear():
+    """
+    Generates a table where castle_clear[square] is the mask of the castling
+    rights that survive a move from or to square. Moving the king or a rook
+    off its starting square, or taking a rook on it, loses those rights.
+    >>> castle_clear = generate_castle_clear()
+    >>> castle_clear[4] == BLACK_KING_SIDE | BLACK_QUEEN_SIDE # e1
+    True
+    >>> castle_clear[63] == ALL_CASTLES ^ BLACK_KING_SIDE # h8
+    True
+    >>> castle_clear[27] == ALL_CASTLES
+    True
+    """
+    castle_clear = [ALL_CASTLES] * 64
+    castle_clear[0] ^= WHITE_QUEEN_SIDE
+    castle_clear[4] ^= WHITE_KING_SIDE | WHITE_QUEEN_SIDE
+    castle_clear[7] ^= WHITE_KING_SIDE
+    castle_clear[56] ^= BLACK_QUEEN_SIDE
+    castle_clear[60] ^= BLACK_KING_SIDE | BLACK_QUEEN_SIDE
+    castle_clear[63] ^= BLACK_KING_SIDE
+    return castle_clear
+
+
+CASTLE_CLEAR = generate_castle_clear()
+
+# Zobrist keys. A board's hash is the xor of ZOB_PIECE[color * 6 + index]
+# [square] for each of its pieces, ZOB_CASTLE of its castling rights and
+# ZOB_EP of the file of the pawn that may be taken en passant, if any.
+# The seed is fixed so that hashes are the same from run to run.
+_zobrist_random = random.Random(2018)
+ZOB_PIECE = [[_zobrist_random.getrandbits(64) for _ in range(64)]
+             for _ in range(12)]
+ZOB_CASTLE = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOB_EP = [_zobrist_random.getrandbits(64) for _ in range(8)]
+ZOB_SIDE = _zobrist_random.getrandbits(64)
+
+
+# The (row, col) jumps of a knight and steps of a king, in the order their
+# moves are listed.
+KNIGHT_OFFSETS = [(1, 2), (2, 1), (-1, 2), (2, -1),
+                  (1, -2), (-2, 1), (-1, -2), (-2, -1)]
+KING_OFFSETS = [(1, 0), (1, 1), (0, 1), (-1, 1),
+                (-1, 0), (-1, -1), (0, -1), (1, -1)]
+
+
+def generate_targets(offsets):
+    """
+    Generates a table where targets[square] is the list of squares reached
+    from square by each of offsets that stays on the board, in the order of
+    offsets.
+    >>> targets = generate_targets(KNIGHT_OFFSETS)
+    >>> targets[1] # b1 to d2, c3, a3
+    [11, 18, 16]
+    >>> len(targets[27])
+    8
+    """
+    targets = [[] for _ in range(64)]
+    for square in range(64):
+        for row_unit, col_unit in offsets:
+            row = square // 8 + row_unit
+            col = square % 8 + col_unit
+            if 0 <= row < 8 and 0 <= col < 8:
+                targets[square].append(row * 8 + col)
+    return targets
+
+
+KNIGHT_TARGETS = generate_targets(KNIGHT_OFFSETS)
+KING_TARGETS = generate_targets(KING_OFFSETS)
+
+
+def generate_targets_bitboards(offsets):
+    """
+    Generates the table of the bitboards of the squares in
+    generate_targets(offsets).
+    """
+    return [sum(1 << target for target in targets)
+            for targets in generate_targets(offsets)]
+
+
+def generate_pawn_attacks():
+    """
+    Generates a table where pawn_attacks[color][square] is the bitboard of
+    the squares a pawn of color on square attacks. Color 0 (white) moves
+    up the board, towards higher rows, and color 1 (black) down.
+    >>> pawn_attacks = generate_pawn_attacks()
+    >>> pawn_attacks[0][12] == (1 << 19) | (1 << 21) # e2 attacks d3, f3
+    True
+    >>> pawn_attacks[1][8] == 1 << 1 # a2 attacks b1
+    True
+    """
+    return [generate_targets_bitboards([(1, -1), (1, 1)]),
+            generate_targets_bitboards([(-1, -1), (-1, 1)])]
+
+
+PAWN_ATTACKS = generate_pawn_attacks()
+
+# The bitboards of the squares a knight or a king on each square attacks.
+KNIGHT_ATTACKS = generate_targets_bitboards(KNIGHT_OFFSETS)
+KING_ATTACKS = generate_targets_bitboards(KING_OFFSETS)
+
+
+def generate_affects():
+    """
+    Generates a table where affects[square] is the bitboard of the squares
+    whose pieces may have different moves once square changes. These are
+    square itself and the squares a queen or a knight on square would
+    reach on an empty board, since every piece moves along one of those
+    lines.
+    >>> affects = generate_affects()
+    >>> bin(affects[0]).count("1") # a1, 21 queen squares, 2 knight squares
+    24
+    """
+    return [(1 << square) | queen_attacks(square, 0) | KNIGHT_ATTACKS[square]
+            for square in range(64)]
+
+
+AFFECTS = generate_affects()
@@ -5,17 +5,24 @@ Some important aspects:
     All pieces and positions are stored in one array.
     This will act as reusable objects. 
 
-
-TODO:
-switch BLACK vs WHITE to white = 0, black = 1. 
 """
 
 # Import
 import chess.utils
+import functools
 import numpy as np
 import json
 
 from copy import copy
+from chess.bitboard import ROOK_DIRECTIONS, BISHOP_DIRECTIONS, \
+    QUEEN_DIRECTIONS, FILE_OF, RANK_OF, ZOB_PIECE, ZOB_CASTLE, ZOB_EP, \
+    ZOB_SIDE, AFFECTS, KNIGHT_TARGETS, KING_TARGETS, KNIGHT_ATTACKS, \
+    KING_ATTACKS, WHITE_KING_SIDE, WHITE_QUEEN_SIDE, BLACK_KING_SIDE, \
+    BLACK_QUEEN_SIDE, ALL_CASTLES, CASTLE_CLEAR, popcount, BETWEEN, \
+    LINE, PAWN_ATTACKS, RAY_SQUARES
+from chess.kernels import U64, USE_NUMBA, USE_CYTHON, blocked_straight, \
+    blocked_diagonal, straight_is_valid, diagonal_is_valid, slider_targets, \
+    rook_attacks, bishop_attacks
 
 # Chess Piece Colors
 WHITE = 0
@@ -29,6 +36,10 @@ BISHOP = 3
 KNIGHT = 4
 PAWN = 5
 
+# Castling right bits of each color
+KING_SIDE = [WHITE_KING_SIDE, BLACK_KING_SIDE]
+QUEEN_SIDE = [WHITE_QUEEN_SIDE, BLACK_QUEEN_SIDE]
+
 
 # Functions
 def generate_all_pieces():
@@ -45,7 +56,7 @@ def generate_all_pieces():
         for t in range(6):
             for row in range(8):
                 for col in range(8):
-                    pieces[t][color][row][col] = types[t](color, Position(row, col))
+                    pieces[t][color][row][col] = types[t](color, _POSITIONS[row * 8 + col])
     return pieces
 
 
@@ -72,8 +83,21 @@ def locate(pos_str):
     g8
     >>> locate("h8")
     h8
+    >>> locate("a1") is locate("a1")
+    True
+    >>> locate("i1")
+    Traceback (most recent call last):
+    ...
+    ValueError: i1 is not a square
     """
-    return Position("12345678".index(pos_str[1]), "abcdefgh".index(pos_str[0]))
+    position = _LOC_CACHE.get(pos_str)
+    if position is None:
+        row = ord(pos_str[1]) - 49
+        col = ord(pos_str[0]) - 97
+        if not (0 <= row < 8 and 0 <= col < 8):
+            raise ValueError("{0} is not a square".format(pos_str))
+        position = _POSITIONS[row * 8 + col]
+    return position
 
 
 def piece_is_blocked_straight(piece, position, board):
@@ -94,22 +118,8 @@ def piece_is_blocked_straight(piece, position, board):
     >>> piece_is_blocked_straight(pawn1, locate("a8"), board)
     True
     """
-    row_change = position.row - piece.position.row
-    col_change = position.col - piece.position.col
-
-    n = abs(row_change)
-    m = abs(col_change)
-
-    if n == 0 or m == 0:
-        row_unit = 0 if n == 0 else row_change // n
-        col_unit = 0 if m == 0 else col_change // m
-        path_length = max(n, m)
-
-        for i in range(1, path_length):
-            if board.get_piece(piece.position + (row_unit * i, col_unit * i)):
-                return True
-        return False
-    return True
+    return blocked_straight(*occupancy(board, piece.color),
+                            piece.square, position.square)
 
 
 def piece_is_blocked_diagonal(piece, position, board):
@@ -141,36 +151,91 @@ def piece_is_blocked_diagonal(piece, position, board):
     >>> piece_is_blocked_diagonal(queen, locate("a2"), board) # Wrong move
     True
     """
-    row_change = position.row - piece.position.row
-    col_change = position.col - piece.position.col
+    return blocked_diagonal(*occupancy(board, piece.color),
+                            piece.square, position.square)
 
-    n = abs(row_change)
-    m = abs(col_change)
 
-    if n == m and n != 0:
-        row_unit = row_change // n
-        col_unit = col_change // m
+def cached_moves(valid_pos):
+    """
+    Decorates the valid_pos method of a piece so that its result is kept in
+    board.moves until Board._invalidate drops it. The same list is returned
+    on every call, so callers must not modify it.
+    """
+    @functools.wraps(valid_pos)
+    def cached_valid_pos(self, board):
+        entry = board.moves.get(self.square)
+        if entry and entry[0] is self:
+            return entry[1]
+        positions = valid_pos(self, board)
+        board.moves[self.square] = (self, positions)
+        board.cached |= 1 << self.square
+        return positions
+    return cached_valid_pos
+
+
+def occupancy(board, color):
+    """
+    Returns the occupancy bitboards of color and of its opponent, in the
+    form taken by the kernels.
+    """
+    return U64(board.occ[color]), U64(board.occ[1 - color])
 
-        for i in range(1, n):
-            if board.get_piece(piece.position + (row_unit * i, col_unit * i)):
-                return True
-        return False
-    return True
+
+def slider_valid_pos(piece, board, directions):
+    """
+    Returns the positions piece can slide to along the given directions,
+    a range of indices into bitboard.DIRECTIONS. Positions are listed ray
+    by ray, from nearest to farthest.
+    >>> board = Board(empty=True)
+    >>> rook = Rook(WHITE, locate("a1"))
+    >>> board.add_piece(rook)
+    >>> board.add_piece(Pawn(WHITE, locate("a3")))
+    >>> board.add_piece(Pawn(BLACK, locate("c1")))
+    >>> slider_valid_pos(rook, board, ROOK_DIRECTIONS)
+    [a2, b1, c1]
+    """
+    if USE_NUMBA or USE_CYTHON:
+        targets = slider_targets(*occupancy(board, piece.color), piece.square,
+                                 directions.start, directions.stop)
+        return [_POSITIONS[target] for target in targets]
+
+    # In plain Python, walking the precomputed rays over board.squares is
+    # faster than the kernel's row and column arithmetic.
+    valid_pos = []
+    squares = board.squares
+    rays = RAY_SQUARES[piece.square]
+    for direction in directions:
+        for target in rays[direction]:
+            other = squares[target]
+            if other is None:
+                valid_pos.append(_POSITIONS[target])
+                continue
+            if other.color != piece.color:
+                valid_pos.append(_POSITIONS[target])
+            break
+    return valid_pos
 
 
 # Position class
 class Position:
+    __slots__ = ("row", "col", "square")
+
     def __init__(self, row, col):
         """ 
-        Constructs a position with row and col members.
+        Constructs a position with row and col members. The square member
+        is the index row * 8 + col used by the bitboards, and is only
+        meaningful when the position is in range.
         >>> pos = Position(3, 2)
         >>> pos.row
         3
         >>> pos.col
         2
+        >>> pos.square
+        26
         """
         self.row = row
         self.col = col
+        self.square = row * 8 + col
     
     def __str__(self):
         """
@@ -200,18 +265,28 @@ class Position:
         b2
         >>> locate("c4") + (1, -1)
         b5
+        >>> locate("a1") + (1, 1) is locate("b2")
+        True
         """
-        return Position(self.row + pair[0], self.col + pair[1])
+        row = self.row + pair[0]
+        col = self.col + pair[1]
+        if 0 <= row < 8 and 0 <= col < 8:
+            return _POSITIONS[row * 8 + col]
+        return Position(row, col)
 
     def __eq__(self, other):
         """
-        Returns true if two position objects are equal.
+        Returns true if two position objects are equal. Positions on the
+        board are shared, so most equal positions are the same object.
         >>> locate("a1") == locate("a1")
         True
         >>> locate("c3") == locate("d5")
         False
+        >>> Position(2, 2) == locate("c3")
+        True
         """
-        return self.row == other.row and self.col == other.col
+        return self is other\
+            or self.row == other.row and self.col == other.col
 
     def in_range(self):
         """
@@ -224,6 +299,15 @@ class Position:
         return 0 <= self.row < 8 and 0 <= self.col < 8
 
 
+# The positions of the 64 squares, indexed by square. Everything in this
+# module that makes a position on the board takes it from here, rather than
+# making a new one.
+_POSITIONS = [Position(row, col) for row in range(8) for col in range(8)]
+
+# The positions of the 64 squares by name, shared by every call to locate.
+_LOC_CACHE = {str(position): position for position in _POSITIONS}
+
+
 # Move class
 class Move:
     def __init__(self, piece, position, ep=False, castle=False, promote=None):
@@ -232,6 +316,7 @@ class Move:
         self.ep = ep
         self.castle = castle
         self.promote = promote
+        self.next = None
 
     def from_json(json):
         piece = Piece.from_json(json["piece"])
@@ -248,6 +333,25 @@ class Move:
     def __eq__(self, other):
         return self.piece == other.piece and self.position == other.position
 
+
+# Undo class
+class Undo:
+    __slots__ = ("squares", "en_passant", "castle_rights", "kings", "hash")
+
+    def __init__(self, squares, en_passant, castle_rights, kings, hash):
+        """
+        Records what a call to Board.make_move changed, so that
+        Board.unmake_move can restore it. self.squares is a list of
+        (square, piece) pairs holding what was on each square the move may
+        touch, and the remaining members are the board's previous state.
+        """
+        self.squares = squares
+        self.en_passant = en_passant
+        self.castle_rights = castle_rights
+        self.kings = kings
+        self.hash = hash
+
+
 # Board class
 class Board:
     # For testing purposes:
@@ -261,7 +365,19 @@ class Board:
         There are some instance variables that are of importance.
 
         self.board is a two dimensional array that stores each of the pieces
-        in their respective locations.
+        in their respective locations. self.squares holds the same pieces in
+        a flat list indexed by square, row * 8 + col.
+
+        self.bb and self.occ are the bitboards of the board. self.bb[color][index]
+        has a bit set for each square holding a piece of that color and index,
+        while self.occ[color] has a bit set for each square holding a piece of
+        that color. The bit of the square (row, col) is 1 << (row * 8 + col).
+
+        self.pieces[color] is a list of the pieces of that color on the board,
+        in no particular order, and self.piece_index maps the square of each
+        piece to its index in that list. Keeping the index lets a piece be
+        taken off by moving the last piece of the list into its slot, rather
+        than by searching the list.
 
         self.history is an array of the moves that have occurred so far. Any move
         is recorded by a call to the move_piece method. It is used by the
@@ -271,9 +387,18 @@ class Board:
         thus is "en passant"-able. That is, a pawn in the correct conditions
         may be able to take the pawn. 
 
-        self.queen_side_castle and self.king_side_castle are dictionaries consisting
-        of two keys WHITE and BLACK which tells whether the respective king may
-        castle.
+        self.castle_rights has a bit set for each way a king may still castle.
+        KING_SIDE[color] and QUEEN_SIDE[color] are the bits of each color.
+
+        self.hash is the Zobrist hash of the pieces, castling rights and en
+        passant pawn. It is kept up to date by every method that changes
+        the board, so equal positions have equal hashes.
+
+        self.moves caches the result of valid_pos, mapping a square to the
+        piece on it and its valid positions. self.cached is the bitboard of
+        the squares in self.moves. When a square changes, only the entries
+        of the pieces that could reach it are dropped (see _invalidate), so
+        most entries survive a make_move and unmake_move.
 
         >>> board = Board()
         >>> print(board.board[0][0].name)
@@ -290,25 +415,44 @@ class Board:
         king
         >>> print(board.board[7][0].color)
         1
+        >>> board.occ[WHITE] == 0xFFFF
+        True
+        >>> board.bb[BLACK][PAWN] == 0xFF << 48
+        True
         """
+        self.board = [[None] * 8, [None] * 8, [None] * 8, [None] * 8,
+                      [None] * 8, [None] * 8, [None] * 8, [None] * 8]
+        self.squares = [None] * 64
+        self.occ = [0, 0]
+        self.bb = [[0] * 6, [0] * 6]
+        self.pieces = [[], []]
+        self.piece_index = {}
+        self.hash = 0
+        self.moves = {}
+        self.cached = 0
+
         if json:
-            self.board = json["board"]
             self.kings = json["kings"]
             self.en_passant = Piece.from_json(json["en_passant"])
-            self.queen_side_castle = json["queen_side_castle"]
-            self.king_side_castle = json["king_side_castle"]
+            self.castle_rights = 0
+            for color in [WHITE, BLACK]:
+                if json["king_side_castle"][color]:
+                    self.castle_rights |= KING_SIDE[color]
+                if json["queen_side_castle"][color]:
+                    self.castle_rights |= QUEEN_SIDE[color]
+            self.hash ^= self._state_hash()
 
             for i in range(8):
                 for j in range(8):
-                    self.board[i][j] = Piece.from_json(self.board[i][j])
+                    piece = Piece.from_json(json["board"][i][j])
+                    if piece:
+                        self._put(piece)
             return 
 
-        self.board = [[None] * 8, [None] * 8, [None] * 8, [None] * 8,
-                      [None] * 8, [None] * 8, [None] * 8, [None] * 8]
         self.kings = [None, None]
         self.en_passant = None
-        self.queen_side_castle = [True, True]
-        self.king_side_castle = [True, True]
+        self.castle_rights = ALL_CASTLES
+        self.hash ^= self._state_hash()
        
         if not empty:
             # Populate board
@@ -399,15 +543,10 @@ class Board:
         1
         """
         score = 0
-        for i in range(8):
-            for j in range(8):
-                p = self.board[i][j]
-                if p is None:
-                    continue
-                if p.color == color:
-                    score += p.points
-                else:
-                    score -= p.points
+        own = self.bb[color]
+        opp = self.bb[1 - color]
+        for index in range(6):
+            score += POINTS[index] * (popcount(own[index]) - popcount(opp[index]))
         return score
 
     def get_piece(self, position):
@@ -427,6 +566,18 @@ class Board:
             raise ValueError("no piece at {0}".format(position))
         return self.board[position.row][position.col]
 
+    def piece_at(self, square):
+        """
+        Gets piece on board at the given square index. Unlike get_piece,
+        the square is not checked to be in range.
+        >>> board = Board()
+        >>> board.piece_at(locate("h8").square).name
+        'rook'
+        >>> board.piece_at(locate("e4").square) is None
+        True
+        """
+        return self.squares[square]
+
     def add_piece(self, piece):
         """
         Adds piece on board at given position.
@@ -438,21 +589,172 @@ class Board:
         >>> pawn.position
         d4
         """
-        self.board[piece.position.row][piece.position.col] = piece
+        self._put(piece)
 
         # Record King
         if piece.name == "king":
             self.kings[piece.color] = piece
+
+    def _put(self, piece):
+        """
+        Places piece on its square, keeping the bitboards in sync. Any
+        piece previously on the square is taken off first.
+        """
+        square = piece.square
+        if self.squares[square]:
+            self._take(square)
+        self._invalidate(square)
+        bit = 1 << square
+        self.bb[piece.color][piece.index] ^= bit
+        self.occ[piece.color] ^= bit
+        self.hash ^= ZOB_PIECE[piece.color * 6 + piece.index][square]
+        self.board[square >> 3][square & 7] = piece
+        self.squares[square] = piece
+        pieces = self.pieces[piece.color]
+        self.piece_index[square] = len(pieces)
+        pieces.append(piece)
+
+    def _take(self, square):
+        """
+        Takes the piece on square off the board, keeping the bitboards
+        in sync, and returns it. Returns None if the square is empty.
+        """
+        piece = self.squares[square]
+        if piece:
+            self._invalidate(square)
+            bit = 1 << square
+            self.bb[piece.color][piece.index] ^= bit
+            self.occ[piece.color] ^= bit
+            self.hash ^= ZOB_PIECE[piece.color * 6 + piece.index][square]
+            self.board[square >> 3][square & 7] = None
+            self.squares[square] = None
+            # Swap the last piece into the slot of the piece taken off
+            pieces = self.pieces[piece.color]
+            index = self.piece_index.pop(square)
+            last = pieces.pop()
+            if last is not piece:
+                pieces[index] = last
+                self.piece_index[last.square] = index
+        return piece
+
+    def _invalidate(self, square):
+        """
+        Drops the cached valid positions of the pieces whose moves may
+        change when square changes.
+        """
+        stale = AFFECTS[square] & self.cached
+        if stale:
+            self.cached ^= stale
+            while stale:
+                bit = stale & -stale
+                stale ^= bit
+                del self.moves[bit.bit_length() - 1]
+
+    def _invalidate_en_passant(self, en_passant):
+        """
+        Drops the cached valid positions of the pawns that could take either
+        en_passant, the previous en passant pawn, or the current one.
+        """
+        if en_passant is not self.en_passant:
+            if en_passant:
+                self._invalidate(en_passant.square)
+            if self.en_passant:
+                self._invalidate(self.en_passant.square)
+
+    def _state_hash(self):
+        """
+        Returns the part of the hash given by the castling rights and the
+        en passant pawn.
+        """
+        if self.en_passant:
+            return ZOB_CASTLE[self.castle_rights]\
+                ^ ZOB_EP[self.en_passant.position.col]
+        return ZOB_CASTLE[self.castle_rights]
+
+    def key(self, turn):
+        """
+        Returns the hash of the board with turn to move, for use as the key
+        of a transposition table.
+        >>> board = Board()
+        >>> board.key(WHITE) == board.key(BLACK)
+        False
+        >>> undo = board.make_move(Move(board.get_piece(locate("b1")), locate("c3")))
+        >>> key = board.key(BLACK)
+        >>> board.unmake_move(undo)
+        >>> undo = board.make_move(Move(board.get_piece(locate("g1")), locate("f3")))
+        >>> undo = board.make_move(Move(board.get_piece(locate("b1")), locate("c3")))
+        >>> undo = board.make_move(Move(board.get_piece(locate("f3")), locate("g1")))
+        >>> board.key(BLACK) == key # Same position by a different order
+        True
+        """
+        if turn == BLACK:
+            return self.hash ^ ZOB_SIDE
+        return self.hash
     
     def make_move(self, move):
         """
         Takes a move object and applies the move to the current board.
+        Returns an Undo object that unmake_move takes to put the board
+        back the way it was. The board is changed in place, so a search
+        may try a move and take it back without copying the board.
+        >>> board = Board()
+        >>> pawn = board.get_piece(locate("e2"))
+        >>> undo = board.make_move(Move(pawn, locate("e4")))
+        >>> board.get_piece(locate("e4")).name, board.en_passant.position
+        ('pawn', e4)
+        >>> board.unmake_move(undo)
+        >>> board.get_piece(locate("e2")) is pawn, board.en_passant
+        (True, None)
+        """
+        piece = move.piece
+        squares = [piece.square, move.position.square]
+        if move.ep:
+            squares.append(move.position.square
+                           - (8 if piece.color == WHITE else -8))
+        if move.castle:
+            row = piece.position.row * 8
+            squares.extend(range(row, row + 8))
+        undo = Undo([(square, self.piece_at(square)) for square in squares],
+                    self.en_passant,
+                    self.castle_rights,
+                    self.kings.copy(),
+                    self.hash)
+        try:
+            self.move_piece(piece,
+                    move.position,
+                    ep=move.ep,
+                    castle=move.castle,
+                    promote=move.promote)
+        except ValueError:
+            self.unmake_move(undo)
+            raise
+        return undo
+
+    def unmake_move(self, undo):
         """
-        self.move_piece(move.piece, 
-                move.position, 
-                ep=move.ep, 
-                castle=move.castle, 
-                promote=move.promote)
+        Takes back the move that returned undo from make_move. Moves must
+        be taken back in the reverse order they were made.
+        >>> board = Board()
+        >>> queen = board.get_piece(locate("d8"))
+        >>> undo = board.make_move(Move(queen, locate("d2"))) # Capture
+        >>> board.in_check(WHITE)
+        True
+        >>> board.unmake_move(undo)
+        >>> board.get_piece(locate("d2")).name, board.get_piece(locate("d8")) is queen
+        ('pawn', True)
+        >>> board.is_consistent()
+        True
+        """
+        for square, piece in reversed(undo.squares):
+            if piece:
+                self._put(piece)
+            else:
+                self._take(square)
+        self._invalidate_en_passant(undo.en_passant)
+        self.en_passant = undo.en_passant
+        self.castle_rights = undo.castle_rights
+        self.kings = undo.kings
+        self.hash = undo.hash
 
     # TODO: Add more doctests and thoroughly describe what happens
     # in the docs.
@@ -486,7 +788,9 @@ class Board:
                 Position. 
         Optional Parameters:
             ep -- Whether the move is an en passant or not. True or False.
-            castle -- Whether to castle or not. True or False.
+            castle -- Whether to castle or not. True or False. When
+                castling, position is where the king ends up, on the c or
+                g file, and the rook is moved to the square beside it.
             promote -- Piece to promote to, if the move is a promotion. 
                 Default value is None.
 
@@ -510,34 +814,33 @@ class Board:
         >>> board.get_piece(locate("c1")) is None
         True
         """
-        # Handle En passant
-        if piece.name == "pawn":
-            unit = 1 if piece.color == WHITE else -1
-            start = 1 if piece.color == WHITE else 6
-            if piece.position.row == start and position.row == start + 2 * unit:
-                self.en_passant = all_pieces[piece.index][piece.color][position.row][position.col]
+        state = self._state_hash()
+        en_passant = self.en_passant
+        castle_rights = self.castle_rights
+
+        # Handle En passant. Only a pawn that has just moved two steps may
+        # be taken en passant, so any other move clears it.
+        if piece.index == PAWN and piece.position.row == piece.start_row\
+                and position.row == piece.start_row + 2 * piece.unit:
+            self.en_passant = all_pieces[piece.index][piece.color][position.row][position.col]
         else:
             self.en_passant = None
 
         # Handle Castling
-        if piece.name == "king":
-            self.queen_side_castle[piece.color] = False
-            self.king_side_castle[piece.color] = False
+        self.castle_rights &= CASTLE_CLEAR[piece.square]\
+            & CASTLE_CLEAR[position.square]
 
-        if piece.name == "rook" and piece.position.row == 0:
-            self.queen_side_castle[piece.color] = False
-
-        if piece.name == "rook" and piece.position.row == 7:
-            self.king_side_castle[piece.color] = False
+        self.hash ^= state ^ self._state_hash()
+        self._invalidate_en_passant(en_passant)
         
         # En passant
         if ep:
             if piece.index != PAWN:
                 raise ValueError("only pawns may move en passant")
-            target = self.get_piece(position + (-1, 0))
-            if not target or target is not self.en_passant:
+            target = self.get_piece(position + (-piece.unit, 0))
+            if not target or target is not en_passant:
                 raise ValueError("move is not en passant")
-            target.remove_piece(target.position)
+            self.remove_piece(target.position)
 
         # Castle
         if castle:
@@ -545,40 +848,47 @@ class Board:
                 raise ValueError("only king may castle")
             if position.row != piece.position.row:
                 raise ValueError("cannot castle king to this row")
-            elif position.col == 3:
-                if not self.queen_side_castle[piece.color]:
+            elif piece.position.col != 4:
+                raise ValueError("king is not on its starting square")
+            elif position.col == 2:
+                if not castle_rights & QUEEN_SIDE[piece.color]:
                     raise ValueError("cannot move since either rook or king\
                         has previously moved")
                 unit = -1
-            elif position.col == 7:
-                if not self.king_side_castle[piece.color]:
+                rook = self.board[position.row][0]
+            elif position.col == 6:
+                if not castle_rights & KING_SIDE[piece.color]:
                     raise ValueError("cannot move since either rook or king\
                             has previously moved")
                 unit = 1
+                rook = self.board[position.row][7]
             else:
                 raise ValueError("cannot castle king to this column")
+            if not rook or rook.index != ROOK or rook.color != piece.color:
+                raise ValueError("no rook to castle with")
+            if BETWEEN[piece.square][rook.square]\
+                    & (self.occ[WHITE] | self.occ[BLACK]):
+                raise ValueError("cannot castle through pieces")
 
             if self.in_check(piece.color):
                 raise ValueError("cannot castle out of check")
-            self.move_piece(piece, position + (0, unit))
+            piece = self.move_piece(piece, piece.position + (0, unit))
             if self.in_check(piece.color):
                 raise ValueError("cannot castle through check")
-            self.move_piece(piece, position + (0, unit))
+            piece = self.move_piece(piece, position)
             if self.in_check(piece.color):
                 raise ValueError("cannot castle into check")
-            return
+            self.move_piece(rook, position + (0, -unit))
+            return piece
 
         # Move piece
-        target = self.get_piece(position)
-        if target:
-            self.remove_piece(target.position)
-        self.board[position.row][position.col] = all_pieces[piece.index][piece.color][position.row][position.col]
-        self.board[piece.position.row][piece.position.col] = None
+        self._take(piece.square)
+        self._put(all_pieces[piece.index][piece.color][position.row][position.col])
         if piece.index == KING:
             self.kings[piece.color] = self.board[position.row][position.col]
         # DEBUG!!!
         if Board.debug:
-            assert(self.is_consistent)
+            assert(self.is_consistent())
         
         return self.board[position.row][position.col]
 
@@ -590,8 +900,110 @@ class Board:
         >>> board.get_piece(locate("e2")) is None
         True
         """
-        self.board[position.row][position.col] = None
+        self._take(position.square)
     
+    def generate_moves(self, turn, heuristic=None, legal=False):
+        """
+        Returns a list of the moves turn may make. If heuristic is given,
+        the moves are ordered by increasing heuristic value of the board
+        after the move. Unlike get_moves, no board is copied.
+
+        If legal is False, the moves are not checked for whether they leave
+        turn in check. If legal is True, those moves are left out, using
+        checkers and pinned rather than making each move. A piece that is
+        not pinned may move anywhere when turn is not in check, and
+        otherwise only to take the checker or to block it. A pinned piece
+        may only move along its pin, and the king may only move to a square
+        that is not attacked once it has left its own. Captures en passant
+        are the exception, and are checked by making them.
+        >>> board = Board()
+        >>> len(board.generate_moves(WHITE))
+        20
+        >>> board.generate_moves(BLACK, lambda b: -b.compute_score(BLACK))[0]
+        bPa7 to a6, None
+        >>> board = Board(empty=True)
+        >>> board.add_piece(King(WHITE, locate("e1")))
+        >>> board.add_piece(Rook(WHITE, locate("e2")))
+        >>> board.add_piece(Queen(BLACK, locate("e8")))
+        >>> board.add_piece(King(BLACK, locate("a8")))
+        >>> [move.position for move in board.generate_moves(WHITE, legal=True)]
+        [f2, f1, d1, d2, e3, e4, e5, e6, e7, e8]
+        """
+        moves = []
+        if legal:
+            king = self.kings[turn].square
+            opp = self.occ[1 - turn]
+            checkers = self.checkers(turn)
+            pinned = self.pinned(turn)
+            if not checkers:
+                evasions = ~0
+            elif checkers & (checkers - 1):
+                evasions = 0 # Double check, so only the king may move
+            else:
+                evasions = checkers\
+                    | BETWEEN[king][checkers.bit_length() - 1]
+            # Without the king, so that it does not block the attacks on
+            # squares behind it
+            occupied = (self.occ[WHITE] | self.occ[BLACK]) ^ (1 << king)
+        own = self.occ[turn]
+        while own:
+            bit = own & -own
+            own ^= bit
+            square = bit.bit_length() - 1
+            piece = self.piece_at(square)
+            if not legal:
+                moves.extend(self.piece_moves(piece))
+            elif square == king:
+                for move in self.piece_moves(piece):
+                    if not self.attackers_to(move.position.square, occupied) & opp:
+                        moves.append(move)
+            else:
+                allowed = evasions
+                if pinned & bit:
+                    allowed &= LINE[king][square]
+                for move in self.piece_moves(piece):
+                    if move.ep:
+                        # Taking en passant empties two squares of a row and
+                        # may take a checker that cannot be blocked, so it
+                        # is checked by making it.
+                        undo = self.make_move(move)
+                        if not self.in_check(turn):
+                            moves.append(move)
+                        self.unmake_move(undo)
+                    elif allowed >> move.position.square & 1:
+                        moves.append(move)
+        if heuristic is None:
+            return moves
+
+        priority_queue = chess.utils.PriorityQueue()
+        for move in moves:
+            undo = self.make_move(move)
+            priority_queue.queue(heuristic(self), move)
+            self.unmake_move(undo)
+        moves = []
+        while not priority_queue.is_empty():
+            moves.append(priority_queue.pop())
+        return moves
+
+    def piece_moves(self, piece):
+        """
+        Returns the moves of piece to each of its valid positions. A pawn
+        moving diagonally to an empty square takes en passant, so its move
+        has ep set.
+        >>> board = Board()
+        >>> pawn = board.move_piece(board.get_piece(locate("e2")), locate("e5"))
+        >>> _ = board.move_piece(board.get_piece(locate("d7")), locate("d5"))
+        >>> [(move.position, move.ep) for move in board.piece_moves(pawn)]
+        [(e6, False), (d6, True)]
+        """
+        if piece.index != PAWN:
+            return [Move(piece, position) for position in piece.valid_pos(self)]
+        col = piece.position.col
+        squares = self.squares
+        return [Move(piece, position, ep=position.col != col
+                     and squares[position.square] is None)
+                for position in piece.valid_pos(self)]
+
     def get_moves(self, turn, heuristic=None):
         """
         Returns a generator.
@@ -600,23 +1012,93 @@ class Board:
         """
         if heuristic is None:
             heuristic = lambda a: 0
-        priority_queue = utils.PriorityQueue()
-        for i in range(8):
-            for j in range(8):
-                piece = self.get_piece(Position(i, j))
-                if not piece or not piece.color == turn:
-                    continue
-                positions = piece.valid_pos(self)
-                for p in positions:
-                    move = Move(piece, p)
-                    board_with_move = self.copy()
-                    board_with_move.move_piece(move.piece, move.position)
-                    priority_queue.queue(
-                        heuristic(board_with_move),
-                        (move, board_with_move))
+        priority_queue = chess.utils.PriorityQueue()
+        occupied = self.occ[turn]
+        while occupied:
+            bit = occupied & -occupied
+            occupied ^= bit
+            piece = self.piece_at(bit.bit_length() - 1)
+            for move in self.piece_moves(piece):
+                board_with_move = self.copy()
+                board_with_move.move_piece(move.piece, move.position,
+                                           ep=move.ep)
+                priority_queue.queue(
+                    heuristic(board_with_move),
+                    (move, board_with_move))
         while not priority_queue.is_empty() > 0:
             yield priority_queue.pop()
 
+    def attackers_to(self, square, occupied=None):
+        """
+        Returns the bitboard of the pieces of both colors that attack
+        square. occupied is the bitboard of the squares that block sliding
+        pieces, by default the squares of all the pieces.
+        >>> board = Board(empty=True)
+        >>> board.add_piece(Knight(WHITE, locate("g1")))
+        >>> board.add_piece(Pawn(WHITE, locate("f2")))
+        >>> board.add_piece(Pawn(BLACK, locate("e4")))
+        >>> board.add_piece(Rook(BLACK, locate("f8")))
+        >>> board.attackers_to(locate("f3").square) == (1 << 6) | (1 << 28) | (1 << 61)
+        True
+        >>> board.attackers_to(locate("a5").square)
+        0
+        """
+        if occupied is None:
+            occupied = self.occ[WHITE] | self.occ[BLACK]
+        white = self.bb[WHITE]
+        black = self.bb[BLACK]
+        straight = white[ROOK] | white[QUEEN] | black[ROOK] | black[QUEEN]
+        diagonal = white[BISHOP] | white[QUEEN] | black[BISHOP] | black[QUEEN]
+        return KNIGHT_ATTACKS[square] & (white[KNIGHT] | black[KNIGHT])\
+            | KING_ATTACKS[square] & (white[KING] | black[KING])\
+            | PAWN_ATTACKS[BLACK][square] & white[PAWN]\
+            | PAWN_ATTACKS[WHITE][square] & black[PAWN]\
+            | rook_attacks(square, occupied) & straight\
+            | bishop_attacks(square, occupied) & diagonal
+
+    def checkers(self, color):
+        """
+        Returns the bitboard of the pieces giving check to the king of
+        color.
+        >>> board = Board()
+        >>> board.checkers(WHITE)
+        0
+        >>> queen = board.move_piece(board.get_piece(locate("d8")), locate("e2"))
+        >>> board.checkers(WHITE) == 1 << queen.square
+        True
+        """
+        king = self.kings[color].square
+        return self.attackers_to(king) & self.occ[1 - color]
+
+    def pinned(self, color):
+        """
+        Returns the bitboard of the pieces of color that are pinned to
+        their king. That is, the piece is the only one between its king
+        and a sliding piece of the opponent that would otherwise attack the
+        king.
+        >>> board = Board()
+        >>> board.pinned(WHITE)
+        0
+        >>> board.remove_piece(locate("e7"))
+        >>> board.remove_piece(locate("e8"))
+        >>> rook = board.move_piece(board.get_piece(locate("h8")), locate("e8"))
+        >>> board.pinned(WHITE) == 1 << locate("e2").square
+        True
+        """
+        king = self.kings[color].square
+        opp = self.bb[1 - color]
+        snipers = rook_attacks(king, 0) & (opp[ROOK] | opp[QUEEN])\
+            | bishop_attacks(king, 0) & (opp[BISHOP] | opp[QUEEN])
+        occupied = self.occ[WHITE] | self.occ[BLACK]
+        pinned = 0
+        while snipers:
+            bit = snipers & -snipers
+            snipers ^= bit
+            blockers = BETWEEN[king][bit.bit_length() - 1] & occupied
+            if blockers and not blockers & (blockers - 1):
+                pinned |= blockers & self.occ[color]
+        return pinned
+
     def in_check(self, color):
         """
         Returns true if the given player (color) is currently in check.
@@ -632,22 +1114,33 @@ class Board:
         >>> board.in_check(BLACK)
         False
         """
-        for i in range(8):
-            for j in range(8):
-                piece = self.board[i][j]
-                if piece is None or piece.color == color:
-                    continue
-                if piece.is_valid(self.kings[color].position, self):
-                    return True
-        return False
+        return self.checkers(color) != 0
 
     def is_consistent(self):
+        bb = [[0] * 6, [0] * 6]
+        hash = self._state_hash()
         for i in range(8):
             for j in range(8):
                 piece = self.board[i][j]
+                assert(self.squares[i * 8 + j] is piece)
                 if piece is not None:
                     assert(piece.position.row == i)
                     assert(piece.position.col == j)
+                    bb[piece.color][piece.index] |= 1 << (i * 8 + j)
+                    hash ^= ZOB_PIECE[piece.color * 6 + piece.index][i * 8 + j]
+        assert(bb == self.bb)
+        assert(hash == self.hash)
+        for color in [WHITE, BLACK]:
+            for index, piece in enumerate(self.pieces[color]):
+                assert(self.board[piece.position.row][piece.position.col] is piece)
+                assert(self.piece_index[piece.square] == index)
+        assert(len(self.piece_index) == len(self.pieces[WHITE]) + len(self.pieces[BLACK]))
+        for color in [WHITE, BLACK]:
+            occ = 0
+            for b in bb[color]:
+                occ |= b
+            assert(occ == self.occ[color])
+        return True
 
     def copy(self):
         """
@@ -658,15 +1151,23 @@ class Board:
         board.board = []
         for row in self.board:
             board.board.append(row.copy())
+        board.squares = self.squares.copy()
+        board.occ = self.occ.copy()
+        board.bb = [self.bb[WHITE].copy(), self.bb[BLACK].copy()]
+        board.pieces = [self.pieces[WHITE].copy(), self.pieces[BLACK].copy()]
+        board.piece_index = self.piece_index.copy()
+        board.hash = self.hash
+        board.moves = self.moves.copy()
+        board.cached = self.cached
         board.en_passant = self.en_passant
         board.kings = self.kings.copy()
-        board.king_side_castle = self.king_side_castle.copy()
-        board.queen_side_castle = self.queen_side_castle.copy()
+        board.castle_rights = self.castle_rights
         return board
 
 
 # Pieces
 class Piece:
+    __slots__ = ("color", "position", "square")
     char = "*"
     use_unicode = True
 
@@ -678,7 +1179,7 @@ class Piece:
         self.color is the piece's color.
 
         self.position is the piece's position, an instance of the 
-        Position class.
+        Position class, and self.square is its square index.
 
         self.board is the board that the piece belongs to.
         >>> piece = Piece(BLACK, locate("a1"))
@@ -688,7 +1189,7 @@ class Piece:
         assert color == BLACK or color == WHITE
         self.color = color
         self.position = position
-        self.index = self.index
+        self.square = position.square
 
     def from_json(json): 
         """Constructs a piece from the "json" representation."""
@@ -734,20 +1235,26 @@ class Piece:
 
 
 class Pawn(Piece):
+    __slots__ = ("unit", "start_row")
     name = "pawn"
     char = "P"
     points = 1
     index = 5
 
-    def __init__(*args):
-        """ Constructs a pawn.
+    def __init__(self, color, position):
+        """ Constructs a pawn. self.unit is the row change of a step
+        forward, and self.start_row is the row the pawn starts on.
         >>> pawn = Pawn(BLACK, locate("a2"))
         >>> pawn.name
         'pawn'
         >>> pawn.color
         1
+        >>> pawn.unit, pawn.start_row
+        (-1, 6)
         """
-        Piece.__init__(*args)
+        Piece.__init__(self, color, position)
+        self.unit = 1 - 2 * color
+        self.start_row = 1 + 5 * color
     
     def is_valid(self, position, board):
         """
@@ -783,30 +1290,32 @@ class Pawn(Piece):
         >>> pawn1.is_valid(locate("c6"), board)
         True
         """
-        unit = 1 if self.color == WHITE else -1
-        start = 1 if self.color == WHITE else 6
+        unit = self.unit
+        square = self.square
+        final = position.square
         target = board.get_piece(position)
         # Move one unit
-        if position == self.position + (unit, 0) and not target:
+        if final == square + 8 * unit and not target:
             return True
         # Move two units
-        if position == self.position + (2 * unit, 0)\
-                and self.position.row == start\
-                and not board.get_piece(self.position + (unit , 0))\
+        if final == square + 16 * unit\
+                and RANK_OF[square] == self.start_row\
+                and not board.piece_at(square + 8 * unit)\
                 and not target:
             return True
         # But most importantly, he attac
-        if position == self.position + (unit, 1)\
-                or position == self.position + (unit, -1):
+        if RANK_OF[final] == RANK_OF[square] + unit\
+                and abs(FILE_OF[final] - FILE_OF[square]) == 1:
             if target and target.color != self.color:
                 return True
-            mod_pos = position + (-unit, 0)
-            if board.get_piece(mod_pos)\
-                    and board.get_piece(mod_pos).color != self.color\
-                    and board.get_piece(mod_pos) == board.en_passant:
+            passed = board.piece_at(final - 8 * unit)
+            if passed\
+                    and passed.color != self.color\
+                    and passed is board.en_passant:
                 return True
         return False
     
+    @cached_moves
     def valid_pos(self, board):
         """
         Outputs a list of valid positions to move to.
@@ -825,35 +1334,37 @@ class Pawn(Piece):
         [d4, e4]
         """
         valid_pos = []
-        unit = 1 if self.color == WHITE else -1
-        start = 1 if self.color == WHITE else 6
-        forward_one = self.position + (unit, 0)
-        forward_two = self.position + (2 * unit, 0)
+        unit = 8 * self.unit
+        square = self.square
+        forward = square + unit
+        if not 0 <= forward < 64:
+            return valid_pos
         
         # Move forward
-        if not board.get_piece(forward_one):
-            valid_pos.append(forward_one)
-            if self.position.row == start\
-                    and not board.get_piece(forward_two):
-                valid_pos.append(forward_two)
+        if not board.piece_at(forward):
+            valid_pos.append(_POSITIONS[forward])
+            if RANK_OF[square] == self.start_row\
+                    and not board.piece_at(forward + unit):
+                forward_two = forward + unit
+                valid_pos.append(_POSITIONS[forward_two])
         
         # Attack
-        attack_pos = [self.position + (unit, -1), self.position + (unit, 1)]
-        for p in attack_pos:
-            if not p.in_range():
+        for side in [-1, 1]:
+            if not 0 <= FILE_OF[square] + side < 8:
                 continue
-            ep = p + (-unit, 0)
-            if board.get_piece(p)\
-                    and board.get_piece(p).color != self.color:
-                valid_pos.append(p)
-            elif board.get_piece(ep)\
-                    and board.get_piece(ep) is board.en_passant:
-                valid_pos.append(p)
+            target = forward + side
+            piece = board.piece_at(target)
+            ep = board.piece_at(square + side)
+            if piece and piece.color != self.color:
+                valid_pos.append(_POSITIONS[target])
+            elif ep and ep is board.en_passant:
+                valid_pos.append(_POSITIONS[target])
 
         return valid_pos
 
 
 class Bishop(Piece):
+    __slots__ = ()
     name = "bishop"
     char = "B"
     points = 3
@@ -882,13 +1393,10 @@ class Bishop(Piece):
         >>> bishop.is_valid(locate("h4"), board) # Not a diagonal
         False
         """
-        if piece_is_blocked_diagonal(self, position, board):
-            return False
-        target = board.get_piece(position)
-        if target and target.color == self.color:
-            return False
-        return True
+        return diagonal_is_valid(*occupancy(board, self.color),
+                                 self.square, position.square)
 
+    @cached_moves
     def valid_pos(self, board):
         """
         Returns the possible position for self (bishop) to move.
@@ -904,23 +1412,10 @@ class Bishop(Piece):
         >>> bishop.valid_pos(board)
         [e4, f5, g6, h7, c4, b5, a6, e2, f1]
         """
-        valid_pos = []
-        for unit in [(1, 1), (1, -1), (-1, 1), (-1, -1)]:
-            cur = self.position
-            while True:
-                cur = cur + unit
-                if not cur.in_range():
-                    break
-                piece = board.get_piece(cur)
-                if piece:
-                    if piece.color != self.color:
-                        valid_pos.append(cur)
-                    break
-                
-                valid_pos.append(cur)
-        return valid_pos
+        return slider_valid_pos(self, board, BISHOP_DIRECTIONS)
 
-class Knight(Piece): 
+class Knight(Piece):
+    __slots__ = ()
     name = "knight"
     char = "N"
     points = 3
@@ -945,16 +1440,11 @@ class Knight(Piece):
         >>> knight.is_valid(locate("a3"), board)
         True
         """
-        row_change = abs(self.position.row - position.row)
-        col_change = abs(self.position.col - position.col)
-        if not (row_change == 2 and col_change == 1 or\
-                row_change == 1 and col_change == 2):
-            return False
-        target = board.get_piece(position)
-        if target and target.color == self.color:
-            return False
-        return True
+        bit = 1 << position.square
+        return bool(KNIGHT_ATTACKS[self.square] & bit)\
+            and not board.occ[self.color] & bit
 
+    @cached_moves
     def valid_pos(self, board):
         """
         Returns a list of valid positions for self (knight) to move to.
@@ -969,21 +1459,13 @@ class Knight(Piece):
         >>> knight.valid_pos(board)
         [d6, c7, d4, a7, c3, a3]
         """
-        valid_pos = []
-
-        for unit in [(1, 2), (2, 1), (-1, 2), (2, -1),
-                (1, -2), (-2, 1), (-1, -2), (-2, -1)]:
-            cur = self.position + unit
-            if not cur.in_range():
-                continue
-            piece = board.get_piece(cur)
-            if piece and piece.color == self.color:
-                continue
-            valid_pos.append(cur)
-        
-        return valid_pos
+        own = board.occ[self.color]
+        return [_POSITIONS[target]
+                for target in KNIGHT_TARGETS[self.square]
+                if not own >> target & 1]
 
 class Rook(Piece):
+    __slots__ = ()
     name = "rook"
     char = "R"
     points = 5
@@ -1014,13 +1496,10 @@ class Rook(Piece):
         >>> rook.is_valid(locate("b3"), board)
         False
         """
-        if piece_is_blocked_straight(self, position, board):
-            return False
-        target = board.get_piece(position)
-        if target and target.color == self.color:
-            return False
-        return True
+        return straight_is_valid(*occupancy(board, self.color),
+                                 self.square, position.square)
     
+    @cached_moves
     def valid_pos(self, board):
         """
         Returns the valid moves for rook.
@@ -1036,23 +1515,10 @@ class Rook(Piece):
         >>> rook.valid_pos(board)
         [d5, d6, d7, e4, f4, g4, h4, d3, c4, b4, a4]
         """
-        valid_pos = []
-        for unit in [(1, 0), (0, 1), (-1, 0), (0, -1)]:
-            cur = self.position
-            while True:
-                cur = cur + unit
-                if not cur.in_range():
-                    break
-                piece = board.get_piece(cur)
-                if piece:
-                    if piece.color != self.color:
-                        valid_pos.append(cur)
-                    break
-                
-                valid_pos.append(cur)
-        return valid_pos
+        return slider_valid_pos(self, board, ROOK_DIRECTIONS)
 
 class Queen(Piece):
+    __slots__ = ()
     name = "queen"
     char = "Q"
     points = 9
@@ -1066,35 +1532,18 @@ class Queen(Piece):
         """
         Returns True if move to position is valid.
         """
-        if piece_is_blocked_straight(self,position, board) and\
-                piece_is_blocked_diagonal(self, position, board):
-            return False
-        if board.get_piece(position) and\
-                board.get_piece(position).color == self.color:
-            return False
-        return True
+        own, opp = occupancy(board, self.color)
+        return straight_is_valid(own, opp, self.square, position.square)\
+            or diagonal_is_valid(own, opp, self.square, position.square)
 
+    @cached_moves
     def valid_pos(self, board):
-        valid_pos = []
-        for unit in [(1, 0), (0, 1), (-1, 0), (0, -1),
-                (1, 1), (1, -1), (-1, 1), (-1, -1)]:
-            cur = self.position
-            while True:
-                cur = cur + unit
-                if not cur.in_range():
-                    break
-                piece = board.get_piece(cur)
-                if piece:
-                    if piece.color != self.color:
-                        valid_pos.append(cur)
-                    break
-                
-                valid_pos.append(cur)
-        return valid_pos
+        return slider_valid_pos(self, board, QUEEN_DIRECTIONS)
 
 
 # TODO: Implement castling
 class King(Piece):
+    __slots__ = ()
     name = "king"
     char = "K"
     points = 9001
@@ -1117,21 +1566,14 @@ class King(Piece):
         >>> king.is_valid(locate("d1"), board)
         False
         """
-        row_change = abs(position.row - self.position.row)
-        col_change = abs(position.col - self.position.col)
-
-        if row_change == 0 and col_change == 0:
-            return False
-        if row_change > 1 or col_change > 1:
-            return False
-        if board.get_piece(position) and\
-                board.get_piece(position).color == self.color:
-            return False
-        return True
+        bit = 1 << position.square
+        return bool(KING_ATTACKS[self.square] & bit)\
+            and not board.occ[self.color] & bit
     
     # TODO: Add doctests
     # TODO: Implement castling
     # TODO: Finish
+    @cached_moves
     def valid_pos(self, board):
         """
         Returns the valid positions for the king.
@@ -1144,17 +1586,14 @@ class King(Piece):
         >>> king.valid_pos(board)
         [e2, f2, f1, d1, d2]
         """
-        valid_pos = []
-        for unit in [(1, 0), (1, 1), (0, 1), (-1, 1),
-                (-1, 0), (-1, -1), (0, -1), (1, -1)]:
-            cur = self.position + unit
-            if not cur.in_range():
-                continue
-            target = board.get_piece(cur)
-            if not target or target.color != self.color:
-                valid_pos.append(cur)
+        own = board.occ[self.color]
+        return [_POSITIONS[target]
+                for target in KING_TARGETS[self.square]
+                if not own >> target & 1]
 
-        return valid_pos
 
+# The points of each type of piece, by index
+POINTS = [King.points, Queen.points, Rook.points,
+          Bishop.points, Knight.points, Pawn.points]
 
 all_pieces = generate_all_pieces()
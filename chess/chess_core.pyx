@@ -0,0 +1,158 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+chess_core.pyx -- Defines compiled versions of the kernels in kernels.py
+and of the attack functions in bitboard.py, with bitboards held as C
+unsigned 64 bit ints.
+
+The module is optional. setup.py builds it when Cython is installed, and
+kernels.py uses it in place of the Python kernels only if it can be
+imported. Each function takes and returns the same values as the one it
+replaces.
+"""
+
+from libc.stdint cimport uint64_t
+
+from chess.bitboard import BETWEEN, DIRECTIONS
+
+cdef uint64_t _between[64][64]
+cdef int _row_unit[8]
+cdef int _col_unit[8]
+
+
+cdef void _fill_tables():
+    cdef int initial, final, direction
+    for initial in range(64):
+        for final in range(64):
+            _between[initial][final] = BETWEEN[initial][final]
+    for direction in range(8):
+        _row_unit[direction] = DIRECTIONS[direction][0]
+        _col_unit[direction] = DIRECTIONS[direction][1]
+
+
+_fill_tables()
+
+
+cdef inline int _check(int initial, int final) except -1:
+    # The tables are read without bounds checks, so squares off the board
+    # raise here as indexing the lists of BETWEEN would.
+    if not (0 <= initial < 64 and 0 <= final < 64):
+        raise IndexError("square out of range")
+    return 0
+
+
+def blocked_straight(uint64_t occ_own, uint64_t occ_opp, int initial,
+                     int final):
+    """
+    Returns True if the straight path from initial to final is blocked, or
+    if the two squares do not share a row or column.
+    """
+    _check(initial, final)
+    if initial >> 3 != final >> 3 and initial & 7 != final & 7:
+        return True
+    return ((occ_own | occ_opp) & _between[initial][final]) != 0
+
+
+def blocked_diagonal(uint64_t occ_own, uint64_t occ_opp, int initial,
+                     int final):
+    """
+    Returns True if the diagonal path from initial to final is blocked, or
+    if the two squares do not share a diagonal.
+    """
+    _check(initial, final)
+    cdef int n = abs((final >> 3) - (initial >> 3))
+    cdef int m = abs((final & 7) - (initial & 7))
+    if n != m or n == 0:
+        return True
+    return ((occ_own | occ_opp) & _between[initial][final]) != 0
+
+
+def straight_is_valid(uint64_t occ_own, uint64_t occ_opp, int initial,
+                      int final):
+    """
+    Returns True if a piece sliding straight may move from initial to final.
+    """
+    _check(initial, final)
+    if occ_own & (<uint64_t>1 << final):
+        return False
+    if initial >> 3 != final >> 3 and initial & 7 != final & 7:
+        return False
+    return ((occ_own | occ_opp) & _between[initial][final]) == 0
+
+
+def diagonal_is_valid(uint64_t occ_own, uint64_t occ_opp, int initial,
+                      int final):
+    """
+    Returns True if a piece sliding diagonally may move from initial to
+    final.
+    """
+    _check(initial, final)
+    if occ_own & (<uint64_t>1 << final):
+        return False
+    cdef int n = abs((final >> 3) - (initial >> 3))
+    cdef int m = abs((final & 7) - (initial & 7))
+    if n != m or n == 0:
+        return False
+    return ((occ_own | occ_opp) & _between[initial][final]) == 0
+
+
+def slider_targets(uint64_t occ_own, uint64_t occ_opp, int initial,
+                   int first, int last):
+    """
+    Returns the list of squares a piece on initial can slide to along the
+    directions DIRECTIONS[first:last]. Squares are listed ray by ray, from
+    nearest to farthest.
+    """
+    cdef list targets = []
+    cdef int direction, row, col, square
+    cdef uint64_t bit
+    _check(initial, initial)
+    if not 0 <= first <= last <= 8:
+        raise IndexError("direction out of range")
+    for direction in range(first, last):
+        row = (initial >> 3) + _row_unit[direction]
+        col = (initial & 7) + _col_unit[direction]
+        while 0 <= row < 8 and 0 <= col < 8:
+            square = row * 8 + col
+            bit = <uint64_t>1 << square
+            if occ_own & bit:
+                break
+            targets.append(square)
+            if occ_opp & bit:
+                break
+            row += _row_unit[direction]
+            col += _col_unit[direction]
+    return targets
+
+
+cdef uint64_t _slider_attacks(int square, uint64_t occupied, int first,
+                              int last):
+    cdef uint64_t attacks = 0
+    cdef uint64_t bit
+    cdef int direction, row, col
+    for direction in range(first, last):
+        row = (square >> 3) + _row_unit[direction]
+        col = (square & 7) + _col_unit[direction]
+        while 0 <= row < 8 and 0 <= col < 8:
+            bit = <uint64_t>1 << (row * 8 + col)
+            attacks |= bit
+            if occupied & bit:
+                break
+            row += _row_unit[direction]
+            col += _col_unit[direction]
+    return attacks
+
+
+def rook_attacks(int square, uint64_t occupied):
+    """
+    Returns the bitboard of the squares a rook on square attacks.
+    """
+    _check(square, square)
+    return _slider_attacks(square, occupied, 0, 4)
+
+
+def bishop_attacks(int square, uint64_t occupied):
+    """
+    Returns the bitboard of the squares a bishop on square attacks.
+    """
+    _check(square, square)
+    return _slider_attacks(square, occupied, 4, 8)
@@ -0,0 +1,165 @@
+"""
+kernels.py -- Defines the numeric kernels behind move validation and
+generation. They only take ints (squares and bitboards), so they can be
+compiled with numba's njit.
+
+Compiling only pays off once whole loops run inside numba. Called one at a
+time from Python, numba's dispatch costs more than the kernels themselves,
+so they are compiled only when numba is installed and the environment
+variable CHESS_JIT is set to 1.
+
+Otherwise, if the Cython module chess_core has been built (see setup.py),
+its compiled kernels replace the ones below, along with rook_attacks and
+bishop_attacks from bitboard.py. Failing that, they run as ordinary Python.
+"""
+
+import os
+import numpy as np
+
+from chess.bitboard import BETWEEN, BETWEEN_ARRAY, DIRECTIONS, \
+    rook_attacks, bishop_attacks
+
+try:
+    if os.environ.get("CHESS_JIT") != "1":
+        raise ImportError("CHESS_JIT is not set")
+    from numba import njit
+    USE_NUMBA = True
+except ImportError:
+    USE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """Stands in for numba.njit by returning the function unchanged."""
+        if args and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+# Compiled kernels read globals as constants, which must be numpy arrays or
+# tuples, and take bitboards as unsigned 64 bit ints. Plain Python is faster
+# with lists and ints, so those are used when numba is off. Bitboards
+# should be passed through U64 before calling a kernel.
+if USE_NUMBA:
+    U64 = np.uint64
+    _BETWEEN = BETWEEN_ARRAY
+else:
+    U64 = int
+    _BETWEEN = BETWEEN
+_ONE = U64(1)
+_DIRECTIONS = tuple(DIRECTIONS)
+
+
+@njit(cache=True, fastmath=True)
+def blocked_straight(occ_own, occ_opp, initial, final):
+    """
+    Returns True if the straight path from initial to final is blocked, or
+    if the two squares do not share a row or column.
+    >>> blocked_straight(U64(1 << 8), U64(0), 0, 16) # a2 between a1 and a3
+    True
+    >>> blocked_straight(U64(1 << 8), U64(0), 0, 2)
+    False
+    >>> blocked_straight(U64(0), U64(0), 0, 9) # Not straight
+    True
+    """
+    if initial >> 3 != final >> 3 and initial & 7 != final & 7:
+        return True
+    return ((occ_own | occ_opp) & _BETWEEN[initial][final]) != 0
+
+
+@njit(cache=True, fastmath=True)
+def blocked_diagonal(occ_own, occ_opp, initial, final):
+    """
+    Returns True if the diagonal path from initial to final is blocked, or
+    if the two squares do not share a diagonal.
+    >>> blocked_diagonal(U64(0), U64(1 << 9), 0, 18) # b2 between a1 and c3
+    True
+    >>> blocked_diagonal(U64(0), U64(1 << 9), 0, 9)
+    False
+    >>> blocked_diagonal(U64(0), U64(0), 0, 0) # Not diagonal
+    True
+    """
+    n = abs((final >> 3) - (initial >> 3))
+    m = abs((final & 7) - (initial & 7))
+    if n != m or n == 0:
+        return True
+    return ((occ_own | occ_opp) & _BETWEEN[initial][final]) != 0
+
+
+@njit(cache=True, fastmath=True)
+def straight_is_valid(occ_own, occ_opp, initial, final):
+    """
+    Returns True if a piece sliding straight may move from initial to final.
+    >>> straight_is_valid(U64(1), U64(1 << 16), 0, 16) # Capture
+    True
+    >>> straight_is_valid(U64(1 | 1 << 16), U64(0), 0, 16) # Own piece
+    False
+    """
+    if occ_own & (_ONE << final):
+        return False
+    if initial >> 3 != final >> 3 and initial & 7 != final & 7:
+        return False
+    return ((occ_own | occ_opp) & _BETWEEN[initial][final]) == 0
+
+
+@njit(cache=True, fastmath=True)
+def diagonal_is_valid(occ_own, occ_opp, initial, final):
+    """
+    Returns True if a piece sliding diagonally may move from initial to
+    final.
+    >>> diagonal_is_valid(U64(1), U64(1 << 18), 0, 18)
+    True
+    >>> diagonal_is_valid(U64(1), U64(1 << 9), 0, 18) # Blocked
+    False
+    """
+    if occ_own & (_ONE << final):
+        return False
+    n = abs((final >> 3) - (initial >> 3))
+    m = abs((final & 7) - (initial & 7))
+    if n != m or n == 0:
+        return False
+    return ((occ_own | occ_opp) & _BETWEEN[initial][final]) == 0
+
+
+@njit(cache=True, fastmath=True)
+def slider_targets(occ_own, occ_opp, initial, first, last):
+    """
+    Returns the list of squares a piece on initial can slide to along the
+    directions DIRECTIONS[first:last]. Squares are listed ray by ray, from
+    nearest to farthest.
+    >>> slider_targets(U64(1 | 1 << 16), U64(1 << 2), 0, 0, 4) # a2, b1, c1
+    [8, 1, 2]
+    """
+    targets = []
+    for direction in range(first, last):
+        row_unit, col_unit = _DIRECTIONS[direction]
+        row = (initial >> 3) + row_unit
+        col = (initial & 7) + col_unit
+        while 0 <= row < 8 and 0 <= col < 8:
+            square = row * 8 + col
+            bit = _ONE << square
+            if occ_own & bit:
+                break
+            targets.append(square)
+            if occ_opp & bit:
+                break
+            row += row_unit
+            col += col_unit
+    return targets
+
+
+# The Python versions of the kernels by name, kept so that the compiled
+# ones can be tested against them. numba keeps the function it compiled as
+# py_func.
+PYTHON_KERNELS = {kernel.__name__: getattr(kernel, "py_func", kernel)
+                  for kernel in [blocked_straight, blocked_diagonal,
+                                 straight_is_valid, diagonal_is_valid,
+                                 slider_targets, rook_attacks,
+                                 bishop_attacks]}
+
+USE_CYTHON = False
+if not USE_NUMBA:
+    try:
+        from chess.chess_core import blocked_straight, blocked_diagonal, \
+            straight_is_valid, diagonal_is_valid, slider_targets, \
+            rook_attacks, bishop_attacks
+        USE_CYTHON = True
+    except ImportError:
+        pass
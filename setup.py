@@ -1,5 +1,14 @@
 import setuptools
 
+# The compiled kernels of chess/chess_core.pyx are optional. They are built
+# only when Cython is installed, and a failed build does not stop the install.
+try:
+    from Cython.Build import cythonize
+    ext_modules = cythonize([setuptools.Extension(
+        "chess.chess_core", ["chess/chess_core.pyx"], optional=True)])
+except ImportError:
+    ext_modules = []
+
 with open("README.md", "r") as readme:
     long_description = readme.read()
 
@@ -12,6 +21,8 @@ setuptools.setup(name='chess-ai',
         long_description_content_type="text/markdown",
         url='http://github.com/thkim1011/chess-ai',
         packages=setuptools.find_packages(),
+        ext_modules=ext_modules,
+        extras_require={"jit": ["numba"]},
         license='MIT',
         classifiers=[
             "Programming Language :: Python :: 3"
@@ -1,4 +1,5 @@
 import chess
+import random
 import unittest
 
 
@@ -41,6 +42,160 @@ class TestBoard(unittest.TestCase):
         board.move_piece(board.get_piece(chess.locate("b1")), chess.locate("c3"))
         print(board)
 
+    def test_bitboards(self):
+        board = chess.Board()
+        self.assertTrue(board.is_consistent())
+        board.move_piece(board.get_piece(chess.locate("e2")), chess.locate("e4"))
+        board.move_piece(board.get_piece(chess.locate("d7")), chess.locate("d5"))
+        board.move_piece(board.get_piece(chess.locate("e4")), chess.locate("d5"))
+        board.remove_piece(chess.locate("a1"))
+        self.assertTrue(board.is_consistent())
+        self.assertEqual(board.occ[chess.BLACK].bit_length(), 64)
+        self.assertTrue(board.copy().is_consistent())
+
+    def test_make_unmake(self):
+        board = chess.Board()
+        before = str(board), board.occ.copy(), board.kings.copy()
+        undos = []
+        for turn in [chess.WHITE, chess.BLACK] * 3:
+            move = board.generate_moves(turn)[-1]
+            undos.append(board.make_move(move))
+            self.assertTrue(board.is_consistent())
+        for undo in reversed(undos):
+            board.unmake_move(undo)
+        self.assertTrue(board.is_consistent())
+        self.assertEqual((str(board), board.occ, board.kings), before)
+
+    def test_transposition_key(self):
+        def play(moves):
+            board = chess.Board()
+            for initial, final in moves:
+                board.make_move(chess.Move(board.get_piece(chess.locate(initial)),
+                                           chess.locate(final)))
+            return board
+        board1 = play([("g1", "f3"), ("g8", "f6"), ("e2", "e4"), ("a7", "a6")])
+        board2 = play([("e2", "e4"), ("a7", "a6"), ("g1", "f3"), ("g8", "f6")])
+        self.assertIsNone(board1.en_passant)
+        self.assertEqual(str(board1), str(board2))
+        self.assertEqual(board1.key(chess.WHITE), board2.key(chess.WHITE))
+
+        # A single step clears the pawn that may be taken en passant
+        board = play([("e2", "e3"), ("a7", "a6"), ("d2", "d4"), ("a6", "a5"),
+                      ("e3", "e4"), ("a5", "a4")])
+        self.assertIsNone(board.en_passant)
+        pawn = board.get_piece(chess.locate("e4"))
+        self.assertEqual(repr(pawn.valid_pos(board)), "[e5]")
+
+    def test_generated_en_passant(self):
+        board = chess.Board()
+        for initial, final in [("e2", "e4"), ("a7", "a6"),
+                               ("e4", "e5"), ("d7", "d5")]:
+            board.make_move(chess.Move(board.get_piece(chess.locate(initial)),
+                                       chess.locate(final)))
+        moves = [move for move in board.generate_moves(chess.WHITE, legal=True)
+                 if move.ep]
+        self.assertEqual([repr(move.position) for move in moves], ["d6"])
+        before = str(board), board.key(chess.WHITE)
+        undo = board.make_move(moves[0])
+        self.assertIsNone(board.get_piece(chess.locate("d5")))
+        self.assertEqual(board.compute_score(chess.WHITE), 1)
+        board.unmake_move(undo)
+        self.assertEqual(board.get_piece(chess.locate("d5")).name, "pawn")
+        self.assertEqual((str(board), board.key(chess.WHITE)), before)
+        self.assertTrue(board.is_consistent())
+
+        # Taking en passant answers a check from the pawn that moved
+        board = chess.Board(empty=True)
+        board.add_piece(chess.King(chess.WHITE, chess.locate("c4")))
+        board.add_piece(chess.Pawn(chess.WHITE, chess.locate("e5")))
+        board.add_piece(chess.Pawn(chess.BLACK, chess.locate("d7")))
+        board.add_piece(chess.King(chess.BLACK, chess.locate("h8")))
+        board.make_move(chess.Move(board.get_piece(chess.locate("d7")),
+                                   chess.locate("d5")))
+        self.assertTrue(board.in_check(chess.WHITE))
+        moves = board.generate_moves(chess.WHITE, legal=True)
+        self.assertIn("d6", [repr(move.position) for move in moves if move.ep])
+
+    def test_move_cache(self):
+        board = chess.Board()
+        rook = board.get_piece(chess.locate("a1"))
+        self.assertEqual(rook.valid_pos(board), [])
+        self.assertIn(chess.locate("a1").square, board.moves)
+        undo = board.make_move(chess.Move(board.get_piece(chess.locate("a2")),
+                                          chess.locate("a4")))
+        self.assertNotIn(chess.locate("a1").square, board.moves)
+        self.assertEqual(repr(rook.valid_pos(board)), "[a2, a3]")
+        board.unmake_move(undo)
+        self.assertEqual(rook.valid_pos(board), [])
+
+    def test_castle_rights(self):
+        board = chess.Board(empty=True)
+        board.add_piece(chess.King(chess.WHITE, chess.locate("e1")))
+        board.add_piece(chess.Rook(chess.WHITE, chess.locate("h1")))
+        board.add_piece(chess.Rook(chess.BLACK, chess.locate("a8")))
+        board.add_piece(chess.King(chess.BLACK, chess.locate("e8")))
+        undo = board.make_move(chess.Move(board.get_piece(chess.locate("h1")),
+                                          chess.locate("h8")))
+        self.assertEqual(board.castle_rights, chess.WHITE_QUEEN_SIDE
+                         | chess.BLACK_QUEEN_SIDE)
+        undos = [undo, board.make_move(chess.Move(
+            board.get_piece(chess.locate("a8")), chess.locate("a1")))]
+        self.assertEqual(board.castle_rights, 0)
+        self.assertTrue(board.is_consistent())
+        for undo in reversed(undos):
+            board.unmake_move(undo)
+        self.assertEqual(board.castle_rights, chess.ALL_CASTLES)
+
+    def test_castle(self):
+        board = chess.Board(empty=True)
+        board.add_piece(chess.King(chess.WHITE, chess.locate("e1")))
+        board.add_piece(chess.Rook(chess.WHITE, chess.locate("h1")))
+        board.add_piece(chess.Rook(chess.WHITE, chess.locate("a1")))
+        board.add_piece(chess.King(chess.BLACK, chess.locate("e8")))
+        before = str(board), board.key(chess.WHITE)
+        king = board.kings[chess.WHITE]
+        undo = board.make_move(chess.Move(king, chess.locate("g1"), castle=True))
+        self.assertEqual(board.get_piece(chess.locate("g1")).name, "king")
+        self.assertEqual(board.get_piece(chess.locate("f1")).name, "rook")
+        self.assertIsNone(board.get_piece(chess.locate("h1")))
+        self.assertEqual(board.castle_rights, chess.BLACK_KING_SIDE
+                         | chess.BLACK_QUEEN_SIDE)
+        self.assertTrue(board.is_consistent())
+        board.unmake_move(undo)
+        self.assertEqual((str(board), board.key(chess.WHITE)), before)
+        self.assertIs(board.kings[chess.WHITE], king)
+        self.assertEqual(board.castle_rights, chess.ALL_CASTLES)
+
+        # Castling through an attacked square fails and changes nothing
+        board.add_piece(chess.Rook(chess.BLACK, chess.locate("d8")))
+        before = str(board), board.key(chess.WHITE)
+        with self.assertRaises(ValueError):
+            board.make_move(chess.Move(king, chess.locate("c1"), castle=True))
+        self.assertEqual((str(board), board.key(chess.WHITE)), before)
+
+        # So does castling with a king that is not on e1
+        board = chess.Board(empty=True)
+        board.add_piece(chess.King(chess.WHITE, chess.locate("d1")))
+        board.add_piece(chess.Rook(chess.WHITE, chess.locate("a1")))
+        board.add_piece(chess.King(chess.BLACK, chess.locate("e8")))
+        with self.assertRaises(ValueError):
+            board.make_move(chess.Move(board.kings[chess.WHITE],
+                                       chess.locate("c1"), castle=True))
+
+    def test_legal_moves(self):
+        board = chess.Board()
+        for ply in range(40):
+            turn = ply % 2
+            legal = []
+            for move in board.generate_moves(turn):
+                undo = board.make_move(move)
+                if not board.in_check(turn):
+                    legal.append(move)
+                board.unmake_move(undo)
+            moves = board.generate_moves(turn, legal=True)
+            self.assertEqual(moves, legal)
+            board.make_move(moves[(ply * 7) % len(moves)])
+
     def test_en_passant(self):
         board = chess.Board()
 
@@ -54,5 +209,54 @@ class TestBoard(unittest.TestCase):
         self.assertTrue(white_pawn.is_valid(chess.locate("d6"), board))
         self.assertTrue(chess.locate("d6") in white_pawn.valid_pos(board))
 
+def negamax(board, depth, turn):
+    """Scores board for turn by searching every move, with no table."""
+    if depth == 0:
+        return board.compute_score(turn)
+    maximum = -10000
+    for move in board.generate_moves(turn, legal=True):
+        undo = board.make_move(move)
+        maximum = max(maximum, -negamax(board, depth - 1, 1 - turn))
+        board.unmake_move(undo)
+    return maximum
+
+
+class TestSearch(unittest.TestCase):
+    def positions(self):
+        rng = random.Random(7)
+        for _ in range(3):
+            board = chess.Board()
+            turn = chess.WHITE
+            for _ in range(rng.randrange(6, 14)):
+                moves = board.generate_moves(turn, legal=True)
+                board.make_move(rng.choice(moves))
+                turn = 1 - turn
+            yield board, turn
+
+    def test_pruning_matches_negamax(self):
+        for board, turn in self.positions():
+            before = str(board), board.key(turn)
+            score, move = chess.ai.minimax_with_pruning(board, 3, turn)
+            self.assertEqual((str(board), board.key(turn)), before)
+            self.assertEqual(score, negamax(board, 3, turn))
+
+    def test_shared_table(self):
+        for board, turn in self.positions():
+            table = {}
+            for depth in [1, 2, 3]:
+                score, move = chess.ai.minimax_with_pruning(board, depth, turn,
+                                                            table=table)
+            self.assertEqual(score, chess.ai.minimax_with_pruning(board, 3,
+                                                                  turn)[0])
+            self.assertEqual(table[board.key(turn)][0], 3)
+            # The table kept for the next move still gives exact scores
+            for move in board.generate_moves(turn, legal=True):
+                undo = board.make_move(move)
+                score, _ = chess.ai.minimax_with_pruning(board, 2, 1 - turn,
+                                                         table=table)
+                self.assertEqual(score, negamax(board, 2, 1 - turn))
+                board.unmake_move(undo)
+
+
 if __name__ == "__main__":
     unittest.main()
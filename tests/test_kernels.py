@@ -0,0 +1,75 @@
+import random
+import unittest
+
+try:
+    import chess.chess_core as chess_core
+except ImportError:
+    chess_core = None
+from chess import kernels
+from chess.kernels import PYTHON_KERNELS, U64
+
+PAIR_KERNELS = ["blocked_straight", "blocked_diagonal", "straight_is_valid",
+                "diagonal_is_valid"]
+
+
+def random_boards(count):
+    """
+    Yields count random (occ_own, occ_opp, initial, final) tuples with
+    disjoint occupancies.
+    """
+    rng = random.Random(2018)
+    for _ in range(count):
+        occupied = rng.getrandbits(64) & rng.getrandbits(64)
+        occ_own = occupied & rng.getrandbits(64)
+        yield occ_own, occupied ^ occ_own, rng.randrange(64), rng.randrange(64)
+
+
+@unittest.skipUnless(chess_core, "chess_core is not built")
+class TestChessCore(unittest.TestCase):
+    def test_matches_python_kernels(self):
+        for occ_own, occ_opp, initial, final in random_boards(2000):
+            for name in PAIR_KERNELS:
+                self.assertEqual(
+                    getattr(chess_core, name)(occ_own, occ_opp, initial, final),
+                    PYTHON_KERNELS[name](occ_own, occ_opp, initial, final),
+                    name)
+            for first, last in [(0, 4), (4, 8), (0, 8)]:
+                self.assertEqual(
+                    chess_core.slider_targets(occ_own, occ_opp, initial,
+                                              first, last),
+                    PYTHON_KERNELS["slider_targets"](occ_own, occ_opp,
+                                                     initial, first, last))
+            occupied = occ_own | occ_opp
+            for name in ["rook_attacks", "bishop_attacks"]:
+                self.assertEqual(
+                    getattr(chess_core, name)(initial, occupied),
+                    PYTHON_KERNELS[name](initial, occupied), name)
+
+    def test_squares_off_the_board(self):
+        with self.assertRaises(IndexError):
+            chess_core.straight_is_valid(0, 0, 0, 64)
+        with self.assertRaises(IndexError):
+            chess_core.rook_attacks(-1, 0)
+        with self.assertRaises(IndexError):
+            chess_core.slider_targets(0, 0, 27, 0, 12)
+
+
+@unittest.skipUnless(kernels.USE_NUMBA, "CHESS_JIT is not set")
+class TestNumbaKernels(unittest.TestCase):
+    def test_matches_python_kernels(self):
+        for occ_own, occ_opp, initial, final in random_boards(400):
+            own, opp = U64(occ_own), U64(occ_opp)
+            for name in PAIR_KERNELS:
+                self.assertEqual(
+                    getattr(kernels, name)(own, opp, initial, final),
+                    PYTHON_KERNELS[name](own, opp, initial, final), name)
+            for first, last in [(0, 4), (4, 8), (0, 8)]:
+                self.assertEqual(
+                    list(kernels.slider_targets(own, opp, initial,
+                                                first, last)),
+                    PYTHON_KERNELS["slider_targets"](own, opp, initial,
+                                                     first, last))
+
+
+if __name__ == "__main__":
+    unittest.main()